@@ -1,12 +1,69 @@
 import math
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+Q = math.log(10) / 400
+Q2 = Q * Q
+# 3q^2/pi^2, the constant inside g(RD), folded once at module scope
+K_G = 3 * Q2 / (math.pi * math.pi)
+
+
+def _g(deviation):
+    """
+    Computes g(RD)
+    g(RD) = 1/sqrt(1 + (3q^2(RD)^2)/pi^2)
+    """
+
+    return 1 / math.sqrt(1 + K_G * deviation * deviation)
+
+
+def _expected_score(rating, opp_rating, opp_deviation):
+    """
+    Computes the expected score against an opponent
+    E = 1/(1 + 10^(g(RD')(opp_rating - rating)/400))
+    10^(x/400) is evaluated as exp(qx), which is faster in CPython
+    """
+
+    return 1 / (1 + math.exp(Q * _g(opp_deviation) * (opp_rating - rating)))
+
+
+def _update(rating, deviation, score, opp_rating, opp_deviation):
+    """
+    Applies one sequential Glicko update
+    g and the expected score are computed once and shared between
+    d^2 = 1/(q^2(g(RD')^2E(1-E))) and the rating/deviation updates
+    Returns the new rating and deviation
+    """
+
+    g = _g(opp_deviation)
+    expected_score = 1 / (1 + math.exp(Q * g * (opp_rating - rating)))
+    d2 = 1 / (Q2 * (g * g) * expected_score * (1 - expected_score))
+    new_rating = rating + Q / (1 / (opp_deviation * opp_deviation) + 1 / d2) * (
+        score - expected_score
+    )
+    new_deviation = math.sqrt(1 / (1 / (deviation * deviation) + 1 / d2))
+    return new_rating, new_deviation
+
+
+if njit is not None:
+    _g = njit(cache=True, fastmath=True)(_g)
+    _expected_score = njit(cache=True, fastmath=True)(_expected_score)
+    _update = njit(cache=True, fastmath=True)(_update)
+
 
 class Player:
     """
     Represents a player or object that is to be ranked
     Contains information about rating and rating deviation
+    The scalar rating math lives in the module-level functions above,
+    which Numba compiles when it is available
     """
 
-    Q = math.log(10) / 400
+    __slots__ = ("name", "rating", "deviation", "num_matches")
 
     def __init__(self, name, *, rating=0, deviation=350):
         """
@@ -26,65 +83,44 @@ class Player:
         based on the score again an opponent
         """
 
-        d2 = self.get_d2(opp_rating, opp_devation)
-        new_rating = self.get_new_rating(score, opp_rating, opp_devation, d2)
-        new_deviation = self.get_new_deviation(d2)
-        self.rating = new_rating
-        self.deviation = new_deviation
-        self.num_matches += 1
-
-    def get_new_rating(self, score, opp_rating, opp_deviation, d2):
-        """
-        Get player's new rating based on the score
-        against an opponent
-        """
-
-        return self.rating + self.Q / (1 / opp_deviation**2 + 1 / d2) * (
-            score - self.get_expected_score(opp_rating, opp_deviation)
+        self.rating, self.deviation = _update(
+            self.rating, self.deviation, score, opp_rating, opp_devation
         )
+        self.num_matches += 1
 
-    def get_new_deviation(self, d2):
+    def update_period(self, scores, opp_ratings, opp_deviations):
         """
-        Get player's new deviation based on the score
-        against an opponent
+        Applies one Glicko rating-period update from all matches
+        played in the period
+        Uses the original batched formulas
+        r' = r + q/(1/RD^2 + 1/d^2) * sum(g(RD_j)(s_j - E_j))
+        1/d^2 = q^2 * sum(g(RD_j)^2 E_j(1 - E_j))
+        RD' = sqrt(1/(1/RD^2 + 1/d^2))
         """
 
-        return math.sqrt(1 / (1 / self.deviation**2 + 1 / d2))
+        scores = np.asarray(scores, dtype=np.float64)
+        opp_ratings = np.asarray(opp_ratings, dtype=np.float64)
+        opp_deviations = np.asarray(opp_deviations, dtype=np.float64)
 
-    def get_d2(self, opp_rating, opp_deviation):
-        """
-        Computes
-        d^2 = 1/(q^2(g(RD')^2E(1-E)))
-        where
-        q = ln(10)/400
-        g(RD') = 1/sqrt(1 + (3q^2(RD')^2)/pi^2)
-        RD' is the rating deviation of the opponent
-        E is the expected score against the opponent
-        """
+        g = 1 / np.sqrt(1 + K_G * opp_deviations * opp_deviations)
+        expected_scores = 1 / (1 + np.exp(Q * g * (opp_ratings - self.rating)))
+        d2_inv = Q2 * np.sum(g * g * expected_scores * (1 - expected_scores))
+        denominator = 1 / (self.deviation * self.deviation) + d2_inv
 
-        expected_score = self.get_expected_score(opp_rating, opp_deviation)
-
-        return 1 / (
-            self.Q**2
-            * (self.get_g(opp_deviation) ** 2)
-            * expected_score
-            * (1 - expected_score)
-        )
+        self.rating += Q / denominator * np.sum(g * (scores - expected_scores))
+        self.deviation = math.sqrt(1 / denominator)
+        self.num_matches += scores.size
 
     def get_expected_score(self, opp_rating, opp_deviation):
         """
         Computes the expected score of the player against the opponent
-        E = 1/(1 + 10^(g(RD')(opp_rating - rating)/400))
         """
 
-        return 1 / (
-            1 + 10 ** (self.get_g(opp_deviation) * (opp_rating - self.rating) / 400)
-        )
+        return _expected_score(self.rating, opp_rating, opp_deviation)
 
     def get_g(self, deviation):
         """
         Computes g(RD)
-        g(RD) = 1/sqrt(1 + (3q^2(RD)^2)/pi^2)
         """
 
-        return 1 / math.sqrt(1 + (3 * (self.Q**2) * (deviation**2)) / math.pi**2)
+        return _g(deviation)
@@ -1,8 +1,43 @@
-from player import Player
+from player import Player, K_G, Q
+import logging
 import math
 import random
+import warnings
 import numpy as np
-from sklearn.cluster import KMeans
+
+log = logging.getLogger(__name__)
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+def _performance_bisection(opponents, score, epsilon):
+    """
+    Bisection kernel for Tourney.get_performance
+    Written as a plain loop so Numba can compile it when available
+    """
+
+    low = 0.0
+    high = 4000.0
+    q = math.log(10) / 400
+
+    while high - low > epsilon:
+        mid = (low + high) / 2
+        expected_score = 0.0
+        for k in range(opponents.shape[0]):
+            expected_score += 1 / (1 + math.exp(q * (opponents[k] - mid)))
+        if expected_score > score:
+            high = mid
+        else:
+            low = mid
+
+    return (low + high) / 2
+
+
+if njit is not None:
+    _performance_bisection = njit(cache=True, fastmath=True)(_performance_bisection)
 
 class Tourney:
     """
@@ -15,38 +50,161 @@ class Tourney:
         Initializes a tourney with a list of players
         """
         self.players = players
-        self.matches = []
+        self.name_to_id = {player.name: i for i, player in enumerate(players)}
         self.last_pair = []
 
+        # Match log as three parallel arrays (SoA) instead of a list
+        # of tuples, so bulk consumers read contiguous columns
+        # Grown geometrically; only the first _num_matches entries are
+        # live, so appends are amortized O(1) like list.append
+        self._match_capacity = 16
+        self._num_matches = 0
+        self.match_ids1 = np.empty(self._match_capacity, dtype=np.int32)
+        self.match_ids2 = np.empty(self._match_capacity, dtype=np.int32)
+        self.match_scores = np.empty(self._match_capacity, dtype=np.float64)
+
+        # Per-pair [match count, score sum from the lower id's side],
+        # since the selection and rating code only needs those two
+        # aggregates, not the raw per-pair history
+        # Keyed by the packed int lo * len(players) + hi, which hashes
+        # faster than a tuple and skips the per-lookup tuple build
+        self.pair_stats = {}
+
+        # Comparisons waiting to be applied as one Glicko rating period
+        self._pending = []
+
+        # Per-player list of (opponent id, score from this player's
+        # side), so per-player queries touch O(deg) entries instead of
+        # scanning all matches or all opponents
+        self.incident = [[] for _ in players]
+
+        # Contiguous mirrors of the players' ratings and deviations,
+        # refreshed on every rating update, so vectorized paths read
+        # flat arrays instead of chasing Player objects
+        self.ratings = np.array([player.rating for player in players], dtype=float)
+        self.deviations = np.array(
+            [player.deviation for player in players], dtype=float
+        )
+        self.match_counts = np.array(
+            [player.num_matches for player in players], dtype=np.int64
+        )
+
+        # Expected-score rows cached per player, with version counters
+        # to recompute only the entries whose player has updated
+        self._player_version = np.zeros(len(players), dtype=np.int64)
+        self._expected_cache = {}
+
+        # True ratings from the last fixed-point solve, reused until a
+        # new comparison invalidates them
+        self._true_ratings = None
+        self._true_ratings_epsilon = None
+
+    @property
+    def matches(self):
+        """
+        The match log as a list of (id1, id2, score) tuples
+        """
+
+        return list(
+            zip(
+                self.match_ids1[: self._num_matches].tolist(),
+                self.match_ids2[: self._num_matches].tolist(),
+                self.match_scores[: self._num_matches].tolist(),
+            )
+        )
+
+    def get_player_id(self, name):
+        """
+        Returns the id of the player with the given name
+        """
+
+        return self.name_to_id[name]
+
     def get_best_pair(self):
         """
         Gets the best pair to compare
         """
 
+        # Apply any buffered comparisons first so selection sees
+        # up-to-date ratings and deviations
+        self.flush_period()
+
         # Choose player with highest rating deviation
         best_id = self.get_best_player()
 
         # Choose best opponent for that player
         best_opp_id = self.get_best_opp(best_id)
 
+        # Lazy %-formatting, so the reprs only render when DEBUG is on
+        log.debug("Best pair: %r vs %r", self.players[best_id], self.players[best_opp_id])
+
         return (best_id, best_opp_id)
 
     def receive_comparison(self, id1, id2, score):
         """
         Receives a comparison between two players
         player with id1 scored score against player with id2
+        The rating update is buffered until the rating period is
+        flushed, per the original Glicko batch formulation
         """
 
-        # Update the players' ratings
-        player1_rating = self.players[id1].rating
-        player1_deviation = self.players[id1].deviation
-        self.players[id1].update(
-            score, self.players[id2].rating, self.players[id2].deviation
-        )
-        self.players[id2].update(1 - score, player1_rating, player1_deviation)
+        self._pending.append((id1, id2, score))
+        self._true_ratings = None
+
+        # Record the match, doubling the buffers when full
+        if self._num_matches == self._match_capacity:
+            self._match_capacity *= 2
+            self.match_ids1 = np.resize(self.match_ids1, self._match_capacity)
+            self.match_ids2 = np.resize(self.match_ids2, self._match_capacity)
+            self.match_scores = np.resize(self.match_scores, self._match_capacity)
+        self.match_ids1[self._num_matches] = id1
+        self.match_ids2[self._num_matches] = id2
+        self.match_scores[self._num_matches] = score
+        self._num_matches += 1
+        if id1 < id2:
+            key = id1 * len(self.players) + id2
+            low_score = score
+        else:
+            key = id2 * len(self.players) + id1
+            low_score = 1 - score
+        stats = self.pair_stats.setdefault(key, [0, 0.0])
+        stats[0] += 1
+        stats[1] += low_score
+        self.incident[id1].append((id2, score))
+        self.incident[id2].append((id1, 1 - score))
+
+    def flush_period(self):
+        """
+        Applies all buffered comparisons as one Glicko rating period
+        Each player gets a single batched update computed from the
+        ratings at the start of the period
+        """
 
-        # Record the match
-        self.matches.append((id1, id2, score))
+        if not self._pending:
+            return
+
+        outcomes = {}
+        for id1, id2, score in self._pending:
+            outcomes.setdefault(id1, []).append((score, id2))
+            outcomes.setdefault(id2, []).append((1 - score, id1))
+        self._pending = []
+
+        # Snapshot the pre-period ratings so every update sees the
+        # same period-start values
+        ratings = [player.rating for player in self.players]
+        deviations = [player.deviation for player in self.players]
+
+        for i, games in outcomes.items():
+            player = self.players[i]
+            player.update_period(
+                [score for score, j in games],
+                [ratings[j] for score, j in games],
+                [deviations[j] for score, j in games],
+            )
+            self.ratings[i] = player.rating
+            self.deviations[i] = player.deviation
+            self.match_counts[i] = player.num_matches
+            self._player_version[i] += 1
 
     def get_best_player(self):
         """
@@ -55,58 +213,56 @@ class Tourney:
         In case of ties, returns the player with the highest rating
         In case of ties, chooses randomly
         Avoids choosing the same player twice in a row
+        The tie-break filters run as successive masked reductions over
+        the stat mirrors, each narrowing only the survivors of the
+        previous one, so the common case stops after the deviation test
         """
 
-        highest_deviation = 0
-        candidates = []
-
-        for i, player in enumerate(self.players):
-            if i in self.last_pair:
-                continue
-            if player.deviation > highest_deviation:
-                highest_deviation = player.deviation
-                candidates = [(i, player)]
-            elif player.deviation == highest_deviation:
-                candidates.append((i, player))
-
-        if len(candidates) == 1:
-            #print(f"Best player: {candidates[0][1]} with deviation {highest_deviation}")
-            return candidates[0][0]
-
-        fewest_matches = math.inf
-        new_candidates = []
-
-        for i, candidate in candidates:
-            if candidate.num_matches < fewest_matches:
-                fewest_matches = candidate.num_matches
-                new_candidates = [(i, candidate)]
-            elif candidate.num_matches == fewest_matches:
-                new_candidates.append((i, candidate))
-
-        candidates = new_candidates
-
-        if len(candidates) == 1:
-            #print(f"Best player: {candidates[0][1]} with fewest matches {fewest_matches}")
-            return candidates[0][0]
-
-        highest_rating = -math.inf
-        new_candidates = []
-
-        for i, candidate in candidates:
-            if candidate.rating > highest_rating:
-                highest_rating = candidate.rating
-                new_candidates = [(i, candidate)]
-            elif candidate.rating == highest_rating:
-                new_candidates.append((i, candidate))
+        # Push the players to avoid to the bottom of the order
+        deviations = self.deviations.copy()
+        for i in self.last_pair:
+            deviations[i] = -np.inf
+
+        candidates = np.flatnonzero(deviations == deviations.max())
+        if candidates.size > 1:
+            counts = self.match_counts[candidates]
+            candidates = candidates[counts == counts.min()]
+        if candidates.size > 1:
+            ratings = self.ratings[candidates]
+            candidates = candidates[ratings == ratings.max()]
+        if candidates.size > 1:
+            return int(random.choice(candidates))
+        return int(candidates[0])
+
+    def _get_expected_scores(self, player_id):
+        """
+        Returns the expected scores of player_id against all players
+        Cached between calls; only the entries whose player updated
+        since the cache was written are recomputed
+        """
 
-        candidates = new_candidates
+        current = self._player_version
+        cached = self._expected_cache.get(player_id)
 
-        if len(candidates) == 1:
-            #print(f"Best player: {candidates[0][1]} with rating {highest_rating}")
-            return candidates[0][0]
+        if cached is None or cached[1][player_id] != current[player_id]:
+            # No cache, or the querying player itself changed, so the
+            # whole row is stale
+            expected = np.empty(len(self.players))
+            stale = np.arange(len(self.players))
+        else:
+            expected, versions = cached
+            stale = np.flatnonzero(versions != current)
+
+        if stale.size:
+            rating = self.players[player_id].rating
+            deviations = self.deviations[stale]
+            g = 1 / np.sqrt(1 + K_G * deviations * deviations)
+            expected[stale] = 1 / (
+                1 + np.exp(Q * g * (self.ratings[stale] - rating))
+            )
+            self._expected_cache[player_id] = (expected, current.copy())
 
-        #print(f"Choosing randomly from candidates {[candidate[1] for candidate in candidates]}")
-        return random.choice(candidates)[0]
+        return expected
 
     def get_best_opp(self, player_id):
         """
@@ -114,79 +270,45 @@ class Tourney:
         In case of ties, choose the opponent whose expected score is closest to 0.5
         In case of ties, choose opponent with least matches
         In case of ties, choose randomly
+        All criteria are evaluated in one pass with a composite key;
+        the random jitter in the key resolves exact ties
         """
 
+        # Count matches against each opponent from this player's
+        # incident list: O(deg) appends' worth of work instead of one
+        # dict lookup per opponent
         previous_matches = [0] * len(self.players)
-        for match in self.matches:
-            if match[0] == player_id:
-                previous_matches[match[1]] += 1
-            elif match[1] == player_id:
-                previous_matches[match[0]] += 1
-        
-        # Choose opponent with least matches
-        least_matches = math.inf
-        candidates = []
-
-        for i, opponent in enumerate(self.players):
-            if i == player_id:
-                continue
-            if i in self.last_pair:
-                continue
-            if previous_matches[i] < least_matches:
-                least_matches = previous_matches[i]
-                candidates = [(i, opponent)]
-            elif previous_matches[i] == least_matches:
-                candidates.append((i, opponent))
-
-        if len(candidates) == 1:
-            #print(f"Best opponent for {self.players[player_id]}: {candidates[0][1]} with {least_matches} matches")
-            return candidates[0][0]
-        
-        # Choose opponent with expected score closest to 0.5
-
-        player = self.players[player_id]
-        closest_distance = 0.5
-        new_candidates = []
-
-        for i, opponent in candidates:
-            if i == player_id:
-                continue
-            distance = abs(
-                player.get_expected_score(opponent.rating, opponent.deviation) - 0.5
-            )
-            if distance < closest_distance:
-                closest_distance = distance
-                new_candidates = [(i, opponent)]
-            elif distance == closest_distance:
-                new_candidates.append((i, opponent))
-
-        candidates = new_candidates
-
-        if len(candidates) == 1:
-            #print(f"Best opponent for {self.players[player_id]}: {candidates[0][1]} with distance {closest_distance}")
-            return candidates[0][0]
-        
-        # Choose opponent with least matches
-        least_matches = math.inf
-        new_candidates = []
-
-        for i, opponent in candidates:
-            if i == player_id:
-                continue
-            if opponent.num_matches < least_matches:
-                least_matches = opponent.num_matches
-                new_candidates = [(i, opponent)]
-            elif opponent.num_matches == least_matches:
-                new_candidates.append((i, opponent))
-
-        candidates = new_candidates
-
-        if len(candidates) == 1:
-            #print(f"Best opponent for {self.players[player_id]}: {candidates[0][1]} with {least_matches} matches")
-            return candidates[0][0]
+        for opp_id, _ in self.incident[player_id]:
+            previous_matches[opp_id] += 1
+
+        expected_scores = self._get_expected_scores(player_id)
+
+        best_id = -1
+        best_key = None
+
+        # With 2 or 3 players the last-pair exclusion can rule out the
+        # whole field; retry without it rather than returning a bogus id
+        for ignore_last_pair in (False, True):
+            for i, opponent in enumerate(self.players):
+                if i == player_id:
+                    continue
+                if not ignore_last_pair and i in self.last_pair:
+                    continue
+                key = (
+                    previous_matches[i],
+                    abs(expected_scores[i] - 0.5),
+                    opponent.num_matches,
+                    random.random(),
+                )
+                if best_key is None or key < best_key:
+                    best_key = key
+                    best_id = i
+            if best_key is not None:
+                break
 
-        #print(f"For {self.players[player_id]}, choosing randomly from candidates {[candidates[i][1] for i in range(len(candidates))]}")
-        return random.choice(candidates)[0]
+        if best_id < 0:
+            raise ValueError("no eligible opponent")
+        return best_id
 
     def run(self, filename="results.txt"):
         """
@@ -229,21 +351,33 @@ class Tourney:
     def import_from_file(self, filename):
         """
         Import match results from a file
+        The whole file is parsed in one pass with np.loadtxt instead
+        of per-line splits and conversions
         """
 
-        with open(filename, "r") as f:
-            for line in f:
-                match = line.split()
-                self.receive_comparison(int(match[0]), int(match[1]), float(match[2]))
+        # loadtxt warns on an empty file where the old per-line loop
+        # was a silent no-op; keep that quiet behavior
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            data = np.loadtxt(filename, ndmin=2)
+        if data.size == 0:
+            return
+        for id1, id2, score in data:
+            self.receive_comparison(int(id1), int(id2), float(score))
 
     def write_results(self, filename="results.txt"):
         """
         Writes the results of all matches to a file
+        The whole report is built in memory and written with a single
+        call instead of one write per match
         """
 
         with open(filename, "w") as f:
-            for match in self.matches:
-                f.write(f"{match[0]} {match[1]} {match[2]}\n")
+            f.write(
+                "".join(
+                    f"{id1} {id2} {score}\n" for id1, id2, score in self.matches
+                )
+            )
 
     def write_ratings(self, *, filename="ratings.txt", epsilon=0.01, n=0):
         """
@@ -251,83 +385,147 @@ class Tourney:
         """
 
         ratings = self.get_true_ratings(epsilon=epsilon)
+
+        # Sort by rating, best first, via argsort instead of a Python
+        # sort with a lambda key
+        order = np.argsort(ratings)[::-1]
+
         if n > 0:
             tiers = self.get_tiers(ratings=ratings, n=n)
-            print(ratings)
-            print(tiers)
-            results = [(ratings[i], self.players[i].name, tiers[i]) for i in range(len(ratings))]
+            log.debug("True ratings: %r", ratings)
+            log.debug("Tiers: %r", tiers)
+            results = [(ratings[i], self.players[i].name, tiers[i]) for i in order]
         else:
-            results = [(ratings[i], self.players[i].name) for i in range(len(ratings))]
-        results.sort(reverse=True, key=lambda x: x[0])
+            results = [(ratings[i], self.players[i].name) for i in order]
 
-        
+        # Accumulate the lines and write them in one call
         if n > 0:
-            with open(filename, "w") as f:
-                current_tier = results[0][2]
-                counter = 1
-                for result in results:
-                    f.write(f"{result[1]} {result[0]} {counter}\n")
-                    if result[2] != current_tier:
-                        current_tier = result[2]
-                        counter += 1
-
+            lines = []
+            current_tier = results[0][2]
+            counter = 1
+            for result in results:
+                lines.append(f"{result[1]} {result[0]} {counter}\n")
+                if result[2] != current_tier:
+                    current_tier = result[2]
+                    counter += 1
         else:
-            with open(filename, "w") as f:
-                for result in results:
-                    f.write(f"{result[1]} {result[0]}\n")
+            lines = [f"{result[1]} {result[0]}\n" for result in results]
+
+        with open(filename, "w") as f:
+            f.write("".join(lines))
 
     # write this part in C++ for speed
-    def get_true_ratings(self, *, epsilon=0.01):
+    def get_true_ratings(self, *, epsilon=0.01, force=False):
         """
         Returns a list of ratings
         Iteratively calculate performance of players
         Take average of old and new ratings to avoid divergence
+        The result is cached and reused until a new comparison comes
+        in, so back-to-back readers pay for one solve; pass force=True
+        to recompute anyway
         """
 
-        ratings = [1500] * len(self.players)
+        if (
+            not force
+            and self._true_ratings is not None
+            and self._true_ratings_epsilon <= epsilon
+        ):
+            return self._true_ratings
+
+        n = len(self.players)
+        ratings = np.full(n, 1500.0)
+
+        # Dense matchup-count matrix, filled once from the per-pair
+        # aggregates; the fixed-point loop is then a few whole-matrix
+        # reductions
+        # float32 halves the bytes swept per iteration; reductions
+        # accumulate in float64
+        counts = np.zeros((n, n), dtype=np.float32)
+        score_totals = np.zeros(n)
+        played = np.zeros(n, dtype=bool)
+        if self.pair_stats:
+            keys = np.fromiter(
+                self.pair_stats.keys(), dtype=np.int64, count=len(self.pair_stats)
+            )
+            stats = np.array(list(self.pair_stats.values()), dtype=np.float32)
+            ids1, ids2 = keys // n, keys % n
+            counts[ids1, ids2] = stats[:, 0]
+            counts[ids2, ids1] = stats[:, 0]
+
+            # Per-player totals aggregated straight from the pair
+            # arrays, O(pairs) instead of an n^2 matrix reduction
+            score_totals = np.bincount(
+                ids1, weights=stats[:, 1], minlength=n
+            ) + np.bincount(ids2, weights=stats[:, 0] - stats[:, 1], minlength=n)
+            played = (
+                np.bincount(ids1, minlength=n) + np.bincount(ids2, minlength=n)
+            ) > 0
 
         while True:
 
-            new_ratings = [0] * len(self.players)
-
-            for i, rating in enumerate(ratings):
-                opponents = []
-                score = 0
-                for match in self.matches:
-                    if match[0] == i:
-                        opponents.append(ratings[match[1]])
-                        score += match[2]
-                    elif match[1] == i:
-                        opponents.append(ratings[match[0]])
-                        score += 1 - match[2]
-                if opponents:
-                    new_ratings[i] = (rating + self.get_performance(score, opponents, epsilon=epsilon)) / 2
-                else:
-                    new_ratings[i] = rating
-
-            if all(
-                abs(new_ratings[i] - ratings[i]) < epsilon for i in range(len(ratings))
-            ):
+            # Expected score of every player against every opponent
+            diff = ratings[None, :] - ratings[:, None]
+            expected = 1 / (1 + np.exp(Q * diff))
+
+            # One Newton step per player towards its performance rating:
+            # solve f(r_i) = sum_j counts_ij * E_ij - score_i = 0
+            f = (counts * expected).sum(axis=1, dtype=np.float64) - score_totals
+            fprime = Q * (counts * expected * (1 - expected)).sum(
+                axis=1, dtype=np.float64
+            )
+            performance = ratings - f / np.where(played, fprime, 1)
+
+            # Average of old and new ratings, clamped to the same
+            # bracket the bisection used
+            new_ratings = np.where(
+                played, np.clip((ratings + performance) / 2, 0, 4000), ratings
+            )
+
+            if np.all(np.abs(new_ratings - ratings) < epsilon):
                 break
 
             ratings = new_ratings
-                
-        return ratings
-    
+
+        self._true_ratings = ratings.tolist()
+        self._true_ratings_epsilon = epsilon
+        return self._true_ratings
+
     @staticmethod
     def get_performance(score, opponents, *, epsilon=0.01):
         """
         Returns the performance rating of a player
+        opponents is an array of the opponents' ratings
+        Solved with Newton's method, which needs a handful of
+        iterations where the bisection needed ~30; falls back to the
+        bracketed bisection if the derivative goes flat
         """
 
+        opponents = np.asarray(opponents, dtype=np.float64)
+
+        mid = 1500.0
+        for _ in range(100):
+            expected = np.reciprocal(1 + np.exp(Q * (opponents - mid)))
+            fprime = Q * (expected * (1 - expected)).sum()
+            if fprime <= 1e-12:
+                # All matches effectively decided at this rating, the
+                # bracketed bisection handles the flat tails safely
+                break
+            step = (expected.sum() - score) / fprime
+            mid = min(max(mid - step, 0.0), 4000.0)
+            if abs(step) < epsilon:
+                return mid
+
+        if njit is not None:
+            return _performance_bisection(opponents, score, epsilon)
+
         low = 0
         high = 4000
 
         while high - low > epsilon:
             mid = (low + high) / 2
-            expected_score = 0
-            for opponent in opponents:
-                expected_score += 1 / (1 + 10 ** ((opponent - mid) / 400))
+            expected_score = np.reciprocal(
+                1 + np.exp(Q * (opponents - mid))
+            ).sum()
             if expected_score > score:
                 high = mid
             else:
@@ -338,19 +536,21 @@ class Tourney:
     def get_tiers(self, ratings, n):
         """
         Returns a list of n tiers
+        Splits the sorted ratings below their n - 1 widest gaps, a
+        natural-breaks approximation to 1-D clustering that is
+        deterministic and avoids the sklearn KMeans dependency
         """
 
-        # Reshape the data to fit the sklearn requirement for inputs
-        data = np.array(ratings).reshape(-1, 1)
-
-        # Create a KMeans instance with n_clusters
-        kmeans = KMeans(n_clusters=n, n_init=10)
-
-        # Fit the model to your data using the fit method
-        kmeans.fit(data)
+        ratings = np.asarray(ratings, dtype=float)
+        order = np.argsort(ratings)
 
-        # Now we can get the cluster centers
-        centers = kmeans.cluster_centers_
+        # Mark a tier boundary after each of the n - 1 widest gaps
+        boundaries = np.zeros(len(ratings), dtype=int)
+        if n > 1 and len(ratings) > 1:
+            gaps = np.diff(ratings[order])
+            splits = np.argsort(gaps)[-(n - 1):] + 1
+            boundaries[splits] = 1
 
-        # And the labels for each data point
-        return list(kmeans.labels_)
\ No newline at end of file
+        tiers = np.empty(len(ratings), dtype=int)
+        tiers[order] = np.cumsum(boundaries)
+        return list(tiers)
\ No newline at end of file